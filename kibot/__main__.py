@@ -76,12 +76,9 @@ Help options:
   --help-variants                  List supported variants and details
 
 """
-from datetime import datetime
-from glob import glob
-import gzip
 import locale
+import json
 import os
-import platform
 import re
 import sys
 from sys import path as sys_path
@@ -91,6 +88,7 @@ from . import log
 log.set_domain('kibot')
 logger = log.init()
 from .docopt import docopt
+from .cli_parser import parse_args
 # GS will import pcbnew, so we must solve the nightly setup first
 # Check if we have to run the nightly KiCad build
 nightly = False
@@ -104,39 +102,39 @@ if os.environ.get('KIAUS_USE_NIGHTLY'):  # pragma: no cover (nightly)
     else:
         os.environ['PYTHONPATH'] = pcbnew_path
     nightly = True
-from .banner import get_banner, BANNERS
 from .gs import GS
-from . import dep_downloader
 from .misc import EXIT_BAD_ARGS, W_VARCFG, NO_PCBNEW_MODULE, W_NOKIVER, hide_stderr, TRY_INSTALL_CHECK, W_ONWIN
-from .pre_base import BasePreFlight
 from .error import KiPlotConfigurationError, config_error
-from .config_reader import (CfgYamlReader, print_outputs_help, print_output_help, print_preflights_help, create_example,
-                            print_filters_help, print_global_options_help, print_dependencies, print_variants_help)
-from .kiplot import (generate_outputs, load_actions, config_output, generate_makefile, generate_examples, solve_schematic,
-                     solve_board_file, solve_project_file, check_board_file)
+# Note: the rest of the modules are imported when needed, this makes the help and simple options faster
 GS.kibot_version = __version__
+CONFIG_EXTS = ('.kibot.yaml', '.kiplot.yaml', '.kibot.yaml.gz')
+GZIP_MAGIC = b'\x1f\x8b'
+KICAD_VER_RE = re.compile(r'(\d+)\.(\d+)\.(\d+)(?:\.(\d+))?')
+EMPTY_RE = re.compile('')
 
 
 def list_pre_and_outs(logger, outputs):
+    from .pre_base import BasePreFlight
+    from .kiplot import config_output
     logger.info('Available actions:\n')
     pf = BasePreFlight.get_in_use_objs()
     if len(pf):
-        logger.info('Pre-flight:')
-        for c in pf:
-            logger.info('- '+str(c))
+        logger.info('Pre-flight:\n'+'\n'.join('- '+str(c) for c in pf))
     if len(outputs):
-        logger.info('Outputs:')
         for o in outputs:
             # Note: we can't do a `dry` config because some layer and field names can be validated only if we
             # load the schematic and the PCB.
             config_output(o, dry=False)
-            logger.info('- '+str(o))
+        logger.info('Outputs:\n'+'\n'.join('- '+str(o) for o in outputs))
 
 
 def solve_config(a_plot_config):
     plot_config = a_plot_config
     if not plot_config:
-        plot_configs = glob('*.kibot.yaml')+glob('*.kiplot.yaml')+glob('*.kibot.yaml.gz')
+        # Just one pass over the directory, keeping the order of preference
+        with os.scandir('.') as it:
+            names = [e.name for e in it if e.name.endswith(CONFIG_EXTS) and e.name[0] != '.' and e.is_file()]
+        plot_configs = [n for ext in CONFIG_EXTS for n in names if n.endswith(ext)]
         if len(plot_configs) == 1:
             plot_config = plot_configs[0]
             logger.info('Using config file: '+os.path.relpath(plot_config))
@@ -150,7 +148,7 @@ def solve_config(a_plot_config):
     if not os.path.isfile(plot_config):
         logger.error("Plot config file not found: "+plot_config)
         sys.exit(EXIT_BAD_ARGS)
-    logger.debug('Using configuration file: `{}`'.format(plot_config))
+    logger.debug(f'Using configuration file: `{plot_config}`')
     return plot_config
 
 
@@ -169,7 +167,56 @@ def set_locale():
         pass
 
 
+def get_kicad_env_cache():
+    return os.path.join(os.path.expanduser('~'), '.cache', 'kibot', 'kicad_env.json')
+
+
+def get_kicad_env_key():
+    """ Key to validate the cached KiCad environment.
+        Only enabled when KIBOT_KICAD_CACHE is defined.
+        Changes when the pcbnew module is updated or when the config location could change. """
+    if not os.environ.get('KIBOT_KICAD_CACHE'):
+        return None
+    from importlib.util import find_spec
+    try:
+        spec = find_spec('pcbnew')
+    except (ImportError, ValueError):
+        return None
+    if spec is None or not spec.origin or not os.path.isfile(spec.origin):
+        return None
+    return [spec.origin, os.stat(spec.origin).st_mtime_ns, __version__, nightly, os.environ.get('HOME'),
+            os.environ.get('KICAD_CONFIG_HOME'), os.environ.get('XDG_CONFIG_HOME')]
+
+
+def load_kicad_env(key):
+    """ Get the KiCad version and config path from a previous run """
+    if key is None:
+        return None
+    try:
+        with open(get_kicad_env_cache(), 'rt') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(data, dict) or data.get('key') != key:
+        return None
+    logger.debugl(2, 'Using cached KiCad environment')
+    return data
+
+
+def save_kicad_env(key):
+    fname = get_kicad_env_cache()
+    tmp_name = f'{fname}.{os.getpid()}.tmp'
+    try:
+        os.makedirs(os.path.dirname(fname), exist_ok=True)
+        with open(tmp_name, 'wt') as f:
+            json.dump({'key': key, 'kicad_version': GS.kicad_version, 'kicad_conf_path': GS.kicad_conf_path}, f)
+        os.replace(tmp_name, fname)
+    except OSError as e:
+        logger.debug(f'Failed to cache the KiCad environment: {e}')
+
+
 def detect_kicad():
+    # Always check the module can be imported, gs.py ignores import errors and they are reported here
     try:
         import pcbnew
     except ImportError:
@@ -178,12 +225,20 @@ def detect_kicad():
                      " Do you need to add it to PYTHONPATH?")
         logger.error(TRY_INSTALL_CHECK)
         sys.exit(NO_PCBNEW_MODULE)
-    try:
-        GS.kicad_version = pcbnew.GetBuildVersion()
-    except AttributeError:
-        logger.warning(W_NOKIVER+"Unknown KiCad version, please install KiCad 5.1.6 or newer")
-        # Assume the best case
-        GS.kicad_version = '5.1.5'
+    # Avoid asking pcbnew if we already know the answer
+    key = get_kicad_env_key()
+    cached = load_kicad_env(key)
+    if cached is None:
+        try:
+            GS.kicad_version = pcbnew.GetBuildVersion()
+        except AttributeError:
+            logger.warning(W_NOKIVER+"Unknown KiCad version, please install KiCad 5.1.6 or newer")
+            # Assume the best case
+            GS.kicad_version = '5.1.5'
+            # Don't remember a guess
+            key = None
+    else:
+        GS.kicad_version = cached['kicad_version']
     try:
         # Debian sid may 2021 mess:
         really_index = GS.kicad_version.index('really')
@@ -191,9 +246,9 @@ def detect_kicad():
     except ValueError:
         pass
 
-    m = re.search(r'(\d+)\.(\d+)\.(\d+)(?:\.(\d+))?', GS.kicad_version)
+    m = KICAD_VER_RE.search(GS.kicad_version)
     if m is None:
-        logger.error("Unable to detect KiCad version, got: `{}`".format(GS.kicad_version))
+        logger.error(f"Unable to detect KiCad version, got: `{GS.kicad_version}`")
         sys.exit(NO_PCBNEW_MODULE)
     GS.kicad_version_major = int(m.group(1))
     GS.kicad_version_minor = int(m.group(2))
@@ -209,14 +264,18 @@ def detect_kicad():
     GS.footprint_gr_type = 'MGRAPHIC' if not GS.ki8 else 'PCB_SHAPE'
     GS.board_gr_type = 'DRAWSEGMENT' if GS.ki5 else 'PCB_SHAPE'
     GS.footprint_update_local_coords = GS.dummy1 if GS.ki8 else GS.footprint_update_local_coords_ki7
-    logger.debug('Detected KiCad v{}.{}.{} ({} {})'.format(GS.kicad_version_major, GS.kicad_version_minor,
-                 GS.kicad_version_patch, GS.kicad_version, GS.kicad_version_n))
+    if GS.debug_level:
+        logger.debug(f'Detected KiCad v{GS.kicad_version_major}.{GS.kicad_version_minor}.{GS.kicad_version_patch} '
+                     f'({GS.kicad_version} {GS.kicad_version_n})')
     # Used to look for plug-ins.
     # KICAD_PATH isn't good on my system.
     # The kicad-nightly package overwrites the regular package!!
     GS.kicad_share_path = '/usr/share/kicad'
     if GS.ki6:
-        GS.kicad_conf_path = pcbnew.GetSettingsManager().GetUserSettingsPath()
+        if cached is None:
+            GS.kicad_conf_path = pcbnew.GetSettingsManager().GetUserSettingsPath()
+        else:
+            GS.kicad_conf_path = cached['kicad_conf_path']
         if nightly:
             # Nightly Debian packages uses `/usr/share/kicad-nightly/kicad-nightly.env` as an environment extension
             # This script defines KICAD_CONFIG_HOME="$HOME/.config/kicadnightly"
@@ -233,67 +292,74 @@ def detect_kicad():
         # `../src/common/stdpbase.cpp(62): assert "traits" failed in Get(test_dir): create wxApp before calling this`
         # Found in KiCad 5.1.8, 5.1.9
         # So we temporarily suppress stderr
-        with hide_stderr():
-            GS.kicad_conf_path = pcbnew.GetKicadConfigPath()
+        if cached is None:
+            with hide_stderr():
+                GS.kicad_conf_path = pcbnew.GetKicadConfigPath()
+        else:
+            GS.kicad_conf_path = cached['kicad_conf_path']
         GS.pro_ext = '.pro'
         GS.work_layer = 'Rescue'
     # Dirs to look for plugins
-    GS.kicad_plugins_dirs = []
     # /usr/share/kicad/*
-    GS.kicad_plugins_dirs.append(os.path.join(GS.kicad_share_path, 'scripting'))
-    GS.kicad_plugins_dirs.append(os.path.join(GS.kicad_share_path, 'scripting', 'plugins'))
-    GS.kicad_plugins_dirs.append(os.path.join(GS.kicad_share_path, '3rdparty', 'plugins'))  # KiCad 6.0 PCM
-    # ~/.config/kicad/*
-    GS.kicad_plugins_dirs.append(os.path.join(GS.kicad_conf_path, 'scripting'))
-    GS.kicad_plugins_dirs.append(os.path.join(GS.kicad_conf_path, 'scripting', 'plugins'))
+    dirs = [(GS.kicad_share_path, 'scripting'),
+            (GS.kicad_share_path, 'scripting', 'plugins'),
+            (GS.kicad_share_path, '3rdparty', 'plugins'),  # KiCad 6.0 PCM
+            # ~/.config/kicad/*
+            (GS.kicad_conf_path, 'scripting'),
+            (GS.kicad_conf_path, 'scripting', 'plugins')]
     # ~/.kicad_plugins and ~/.kicad
-    if 'HOME' in os.environ:
-        home = os.environ['HOME']
-        GS.kicad_plugins_dirs.append(os.path.join(home, '.kicad_plugins'))
-        GS.kicad_plugins_dirs.append(os.path.join(home, '.kicad', 'scripting'))
-        GS.kicad_plugins_dirs.append(os.path.join(home, '.kicad', 'scripting', 'plugins'))
+    home = os.environ.get('HOME')
+    if home is not None:
+        dirs.extend(((home, '.kicad_plugins'),
+                     (home, '.kicad', 'scripting'),
+                     (home, '.kicad', 'scripting', 'plugins')))
         if GS.kicad_version_major >= 6:
             ver_dir = str(GS.kicad_version_major)+'.'+str(GS.kicad_version_minor)
             local_share = os.path.join(home, '.local', 'share', 'kicad', ver_dir)
-            GS.kicad_plugins_dirs.append(os.path.join(local_share, 'scripting'))
-            GS.kicad_plugins_dirs.append(os.path.join(local_share, 'scripting', 'plugins'))
-            GS.kicad_plugins_dirs.append(os.path.join(local_share, '3rdparty', 'plugins'))   # KiCad 6.0 PCM
+            dirs.extend(((local_share, 'scripting'),
+                         (local_share, 'scripting', 'plugins'),
+                         (local_share, '3rdparty', 'plugins')))  # KiCad 6.0 PCM
+    GS.kicad_plugins_dirs = [os.path.join(*d) for d in dirs]
     if GS.debug_level > 1:
-        logger.debug('KiCad config path {}'.format(GS.kicad_conf_path))
+        logger.debug(f'KiCad config path {GS.kicad_conf_path}')
+    if cached is None and key is not None:
+        save_kicad_env(key)
 
 
 def parse_defines(args):
     for define in args.define:
-        if '=' not in define:
-            logger.error('Malformed `define` option, must be VARIABLE=VALUE ({})'.format(define))
+        var, sep, val = define.partition('=')
+        if not sep:
+            logger.error(f'Malformed `define` option, must be VARIABLE=VALUE ({define})')
             sys.exit(EXIT_BAD_ARGS)
-        var = define.split('=')[0]
-        GS.cli_defines[var] = define[len(var)+1:]
+        GS.cli_defines[var] = val
 
 
 def parse_global_redef(args):
     for redef in args.global_redef:
-        if '=' not in redef:
-            logger.error('Malformed global-redef option, must be VARIABLE=VALUE ({})'.format(redef))
+        var, sep, val = redef.partition('=')
+        if not sep:
+            logger.error(f'Malformed global-redef option, must be VARIABLE=VALUE ({redef})')
             sys.exit(EXIT_BAD_ARGS)
-        var = redef.split('=')[0]
-        GS.cli_global_defs[var] = redef[len(var)+1:]
+        GS.cli_global_defs[var] = val
 
 
 class SimpleFilter(object):
+    __slots__ = ('number', 'regex', 'error')
+
     def __init__(self, num):
         self.number = num
-        self.regex = re.compile('')
+        self.regex = EMPTY_RE
         self.error = ''
 
 
 def apply_warning_filter(args):
-    if args.no_warn:
-        try:
-            log.set_filters([SimpleFilter(int(n)) for n in args.no_warn.split(',')])
-        except ValueError:
-            logger.error('-w/--no-warn must specify a comma separated list of numbers ({})'.format(args.no_warn))
-            sys.exit(EXIT_BAD_ARGS)
+    try:
+        nums = [int(n) for n in args.no_warn.split(',')]
+    except ValueError:
+        logger.error(f'-w/--no-warn must specify a comma separated list of numbers ({args.no_warn})')
+        sys.exit(EXIT_BAD_ARGS)
+    log.set_filters([SimpleFilter(n) for n in nums])
 
 
 def debug_arguments(args):
@@ -303,6 +369,7 @@ def debug_arguments(args):
 
 
 def detect_windows():
+    import platform
     if platform.system() != 'Windows':
         return
     # Note: We assume this is the Python from KiCad, but we should check it ...
@@ -313,23 +380,50 @@ def detect_windows():
 def main():
     set_locale()
     ver = 'KiBot '+__version__+' - '+__copyright__+' - License: '+__license__
-    GS.out_dir_in_cmd_line = '-d' in sys.argv or '--out-dir' in sys.argv
-    args = docopt(__doc__, version=ver, options_first=True)
+    argv_set = set(sys.argv)
+    GS.out_dir_in_cmd_line = not argv_set.isdisjoint(('-d', '--out-dir'))
+    # Try the fast parser, docopt is used for help, errors and corner cases
+    args = parse_args(sys.argv[1:])
+    if args is None:
+        args = docopt(__doc__, version=ver, options_first=True)
 
     # Set the specified verbosity
     GS.debug_enabled = log.set_verbosity(logger, args.verbose, args.quiet)
     log.debug_level = GS.debug_level = args.verbose
     # We can log all the debug info to a separated file
     if args.log:
-        if os.path.isfile(args.log):
-            os.remove(args.log)
-        else:
-            os.makedirs(os.path.dirname(os.path.abspath(args.log)), exist_ok=True)
+        os.makedirs(os.path.dirname(os.path.abspath(args.log)), exist_ok=True)
         log.set_file_log(args.log)
         GS.debug_level = 10
     # The log setup finished, this is our first log message
-    logger.debug('KiBot {} verbose level: {} started on {}'.format(__version__, args.verbose, datetime.now()))
-    apply_warning_filter(args)
+    if GS.debug_level:
+        from datetime import datetime
+        logger.debug(f'KiBot {__version__} verbose level: {args.verbose} started on {datetime.now()}')
+    if args.no_warn:
+        apply_warning_filter(args)
+    # The banners don't need KiCad or the plug-ins
+    if args.banner is not None:
+        try:
+            id = int(args.banner)
+        except ValueError:
+            logger.error(f'The banner option needs an integer ({args.banner})')
+            sys.exit(EXIT_BAD_ARGS)
+        from .banner import get_banner
+        logger.info(get_banner(id))
+    if args.help_banners:
+        from .banner import BANNERS
+        for c, b in enumerate(BANNERS):
+            logger.info('Banner '+str(c))
+            logger.info(b)
+        sys.exit(0)
+    # The examples need all the plug-ins, but we can check the arguments before loading them
+    if args.example:
+        from .kiplot import check_board_file
+        check_board_file(args.board_file)
+        if args.copy_options and not args.board_file:
+            logger.error('Asked to copy options but no PCB specified.')
+            sys.exit(EXIT_BAD_ARGS)
+
     # Now we have the debug level set we can check (and optionally inform) KiCad info
     detect_kicad()
     detect_windows()
@@ -339,64 +433,62 @@ def main():
     os.environ['INTERACTIVE_HTML_BOM_NO_DISPLAY'] = 'True'
 
     # Parse global overwrite options
-    parse_global_redef(args)
+    if args.global_redef:
+        parse_global_redef(args)
 
     # Disable auto-download if needed
     if args.no_auto_download:
+        from . import dep_downloader
         dep_downloader.disable_auto_download = True
 
     # Output dir: relative to CWD (absolute path overrides)
-    GS.out_dir = os.path.join(os.getcwd(), args.out_dir)
+    GS.out_dir = args.out_dir if os.path.isabs(args.out_dir) else os.path.join(os.getcwd(), args.out_dir)
 
     # Load output and preflight plugins
+    # Note: this must be done after detect_kicad(), some plug-ins (i.e. out_base and out_dxf) check the KiCad version
+    # when imported. So we can't load them in parallel with the KiCad detection.
+    from .kiplot import load_actions
     load_actions()
 
-    if args.banner is not None:
-        try:
-            id = int(args.banner)
-        except ValueError:
-            logger.error('The banner option needs an integer ({})'.format(id))
-            sys.exit(EXIT_BAD_ARGS)
-        logger.info(get_banner(id))
-
     if args.help_outputs or args.help_list_outputs:
+        from .config_reader import print_outputs_help
         print_outputs_help(details=args.help_outputs)
         sys.exit(0)
     if args.help_output:
+        from .config_reader import print_output_help
         print_output_help(args.help_output)
         sys.exit(0)
     if args.help_preflights:
+        from .config_reader import print_preflights_help
         print_preflights_help()
         sys.exit(0)
     if args.help_variants:
+        from .config_reader import print_variants_help
         print_variants_help()
         sys.exit(0)
     if args.help_filters:
+        from .config_reader import print_filters_help
         print_filters_help()
         sys.exit(0)
     if args.help_global_options:
+        from .config_reader import print_global_options_help
         print_global_options_help()
         sys.exit(0)
     if args.help_dependencies:
+        from .config_reader import print_dependencies
         print_dependencies(args.markdown, args.json)
         sys.exit(0)
-    if args.help_banners:
-        for c, b in enumerate(BANNERS):
-            logger.info('Banner '+str(c))
-            logger.info(b)
-        sys.exit(0)
     if args.example:
-        check_board_file(args.board_file)
-        if args.copy_options and not args.board_file:
-            logger.error('Asked to copy options but no PCB specified.')
-            sys.exit(EXIT_BAD_ARGS)
+        from .config_reader import create_example
         create_example(args.board_file, GS.out_dir, args.copy_options, args.copy_and_expand)
         sys.exit(0)
     if args.quick_start:
         # Some kind of wizard to get usable examples
+        from .kiplot import generate_examples
         generate_examples(args.start, args.dry, args.type)
         sys.exit(0)
 
+    from .kiplot import solve_schematic, solve_board_file, solve_project_file
     # Determine the YAML file
     plot_config = solve_config(args.plot_config)
     # Determine the SCH file
@@ -407,26 +499,25 @@ def main():
     GS.set_pro(solve_project_file())
 
     # Parse preprocessor defines
-    parse_defines(args)
+    if args.define:
+        parse_defines(args)
 
     # Read the config file
+    from .config_reader import CfgYamlReader
     cr = CfgYamlReader()
-    outputs = None
-    try:
-        # The Python way ...
-        with gzip.open(plot_config) as cf_file:
-            try:
-                outputs = cr.read(cf_file)
-            except KiPlotConfigurationError as e:
-                config_error(str(e))
-    except OSError:
-        pass
-    if outputs is None:
-        with open(plot_config) as cf_file:
-            try:
-                outputs = cr.read(cf_file)
-            except KiPlotConfigurationError as e:
-                config_error(str(e))
+    # Check if this is a compressed file
+    with open(plot_config, 'rb') as cf_file:
+        magic = cf_file.read(2)
+    if magic == GZIP_MAGIC:
+        import gzip
+        opener = gzip.open
+    else:
+        opener = open
+    with opener(plot_config, 'rt') as cf_file:
+        try:
+            outputs = cr.read(cf_file)
+        except KiPlotConfigurationError as e:
+            config_error(str(e))
 
     # Is just "list the available targets"?
     if args.list:
@@ -435,9 +526,11 @@ def main():
 
     if args.makefile:
         # Only create a makefile
+        from .kiplot import generate_makefile
         generate_makefile(args.makefile, plot_config, outputs)
     else:
         # Do all the job (preflight + outputs)
+        from .kiplot import generate_outputs
         generate_outputs(outputs, args.target, args.invert_sel, args.skip_pre, args.cli_order, args.no_priority,
                          dont_stop=args.dont_stop)
     # Print total warnings
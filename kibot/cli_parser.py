@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2023 Salvador E. Tropea
+# Copyright (c) 2023 Instituto Nacional de Tecnología Industrial
+# License: GPL-3.0
+# Project: KiBot (formerly KiPlot)
+"""
+Fast command line parser
+
+A hand-written equivalent of the docopt grammar found in the __main__ docstring.
+Parsing the docstring on every run is slow, so valid command lines are solved here.
+Anything else (help, version, errors, abbreviated options, etc.) returns None and
+the caller must use docopt, so the docstring is still the authoritative source.
+
+Known difference: when a list option (--define, --global-redef) is used more than once
+docopt repeats the last value (-E a -E a gives [a, a, a]), here we get [a, a].
+The values are stored in dicts, so the result is the same.
+"""
+from .docopt import Dict, clean_name
+
+FLAG = 0
+COUNT = 1
+VALUE = 2
+LIST = 3
+# (short, long, kind[, default])
+OPTIONS = (('-A', '--no-auto-download', FLAG),
+           ('-b', '--board-file', VALUE),
+           (None, '--banner', VALUE),
+           ('-c', '--plot-config', VALUE),
+           ('-C', '--cli-order', FLAG),
+           ('-d', '--out-dir', VALUE, '.'),
+           ('-D', '--dont-stop', FLAG),
+           ('-e', '--schematic', VALUE),
+           ('-E', '--define', LIST),
+           ('-g', '--global-redef', LIST),
+           ('-i', '--invert-sel', FLAG),
+           ('-l', '--list', FLAG),
+           ('-L', '--log', VALUE),
+           ('-m', '--makefile', VALUE),
+           ('-n', '--no-priority', FLAG),
+           ('-p', '--copy-options', FLAG),
+           ('-P', '--copy-and-expand', FLAG),
+           ('-q', '--quiet', FLAG),
+           ('-s', '--skip-pre', VALUE),
+           ('-v', '--verbose', COUNT),
+           ('-V', '--version', FLAG),
+           ('-w', '--no-warn', VALUE),
+           ('-x', '--example', FLAG),
+           (None, '--quick-start', FLAG),
+           (None, '--dry', FLAG),
+           (None, '--start', VALUE, '.'),
+           ('-t', '--type', LIST),
+           ('-h', '--help', FLAG),
+           (None, '--help-banners', FLAG),
+           (None, '--help-dependencies', FLAG),
+           (None, '--help-filters', FLAG),
+           (None, '--help-global-options', FLAG),
+           (None, '--help-list-outputs', FLAG),
+           (None, '--help-output', VALUE),
+           (None, '--help-outputs', FLAG),
+           (None, '--help-preflights', FLAG),
+           (None, '--help-variants', FLAG),
+           (None, '--markdown', FLAG),
+           (None, '--json', FLAG))
+LONG = {o[1]: o for o in OPTIONS}
+SHORT = {o[0]: o for o in OPTIONS if o[0] is not None}
+# Options that select a usage pattern: (allowed options, mutually exclusive groups)
+# None is the default pattern, the only one accepting targets
+MODES = {None: ({'--board-file', '--schematic', '--plot-config', '--out-dir', '--skip-pre', '--dont-stop', '--quiet',
+                 '--verbose', '--log', '--cli-order', '--invert-sel', '--no-priority', '--makefile', '--no-auto-download',
+                 '--global-redef', '--define', '--no-warn', '--banner'},
+                (('--quiet', '--verbose'), ('--cli-order', '--invert-sel', '--no-priority'))),
+         '--list': ({'--verbose', '--board-file', '--schematic', '--plot-config', '--banner', '--define'}, ()),
+         '--example': ({'--verbose', '--board-file', '--out-dir', '--copy-options', '--copy-and-expand', '--banner'},
+                       (('--copy-options', '--copy-and-expand'),)),
+         '--quick-start': ({'--verbose', '--start', '--out-dir', '--dry', '--banner', '--type'}, ()),
+         '--help-filters': ({'--verbose'}, ()),
+         '--help-dependencies': ({'--verbose', '--markdown', '--json'}, (('--markdown', '--json'),)),
+         '--help-global-options': ({'--verbose'}, ()),
+         '--help-list-outputs': ({'--verbose'}, ()),
+         '--help-output': ({'--verbose'}, ()),
+         '--help-outputs': ({'--verbose'}, ()),
+         '--help-preflights': ({'--verbose'}, ()),
+         '--help-variants': ({'--verbose'}, ()),
+         '--help-banners': ({'--verbose'}, ())}
+# Handled only by docopt
+DOCOPT_ONLY = {'--help', '--version'}
+
+
+def _store(opt, value, found):
+    """ Store a value for `opt`, returns False if docopt must solve it """
+    name = opt[1]
+    kind = opt[2]
+    if kind == COUNT:
+        found[name] = found.get(name, 0)+1
+    elif kind == LIST:
+        found.setdefault(name, []).append(value)
+    elif name in found:
+        # Repeated options are errors
+        return False
+    else:
+        found[name] = True if kind == FLAG else value
+    return True
+
+
+def _parse_tokens(argv):
+    """ Split `argv` in options and targets, using the `options_first` docopt semantic """
+    found = {}
+    targets = []
+    argv = list(argv)
+    while argv:
+        arg = argv.pop(0)
+        if arg == '--':
+            # docopt keeps the `--` as a target
+            return None
+        if arg.startswith('--'):
+            name, eq, value = arg.partition('=')
+            opt = LONG.get(name)
+            if opt is None:
+                # Unknown or abbreviated
+                return None
+            if opt[2] in (FLAG, COUNT):
+                if eq:
+                    return None
+            elif not eq:
+                if not argv:
+                    return None
+                value = argv.pop(0)
+            if not _store(opt, value, found):
+                return None
+        elif arg.startswith('-') and arg != '-':
+            shorts = arg[1:]
+            while shorts:
+                opt = SHORT.get('-'+shorts[0])
+                if opt is None:
+                    return None
+                shorts = shorts[1:]
+                value = None
+                if opt[2] in (VALUE, LIST):
+                    if shorts:
+                        value = shorts
+                        shorts = ''
+                    elif argv:
+                        value = argv.pop(0)
+                    else:
+                        return None
+                if not _store(opt, value, found):
+                    return None
+        else:
+            # Options first: all the rest are targets
+            targets = [arg]+argv
+            break
+    return found, targets
+
+
+def parse_args(argv):
+    """ Parse the command line arguments.
+        Returns the same structure created by docopt, or None if docopt must be used """
+    res = _parse_tokens(argv)
+    if res is None:
+        return None
+    found, targets = res
+    if DOCOPT_ONLY.intersection(found):
+        return None
+    modes = [m for m in MODES if m is not None and m in found]
+    if len(modes) > 1:
+        return None
+    mode = modes[0] if modes else None
+    if targets and mode is not None:
+        return None
+    allowed, exclusive = MODES[mode]
+    for name in found:
+        if name != mode and name not in allowed:
+            return None
+    for group in exclusive:
+        if len(found.keys() & group) > 1:
+            return None
+    # Create the same structure returned by docopt
+    args = Dict()
+    for opt in OPTIONS:
+        name = opt[1]
+        kind = opt[2]
+        if name in found:
+            value = found[name]
+        elif kind == FLAG:
+            value = False
+        elif kind == COUNT:
+            value = 0
+        elif kind == LIST:
+            value = []
+        else:
+            value = opt[3] if len(opt) > 3 else None
+        args[name] = value
+    args['TARGET'] = targets
+    for k, v in args.items():
+        setattr(args, clean_name(k), v)
+    return args
@@ -10,11 +10,12 @@ Class to read KiBot config files
 """
 
 import collections
+import hashlib
 import io
 import os
 import json
+import pickle
 from sys import (exit, maxsize)
-from collections import OrderedDict
 
 from .error import KiPlotConfigurationError
 from .misc import (NO_YAML_MODULE, EXIT_BAD_ARGS, EXAMPLE_CFG, WONT_OVERWRITE, W_NOOUTPUTS, W_UNKOUT, W_NOFILTERS,
@@ -22,7 +23,7 @@ from .misc import (NO_YAML_MODULE, EXIT_BAD_ARGS, EXAMPLE_CFG, WONT_OVERWRITE, W
 from .gs import GS
 from .registrable import RegOutput, RegVariant, RegFilter, RegDependency
 from .pre_base import BasePreFlight
-from . import __pypi_deps__
+from . import __pypi_deps__, __version__
 # Logger
 from . import log
 
@@ -50,6 +51,46 @@ except ImportError:
     exit(NO_YAML_MODULE)
 
 
+def get_config_cache(fname):
+    """ Name of the file used to cache the parsed YAML for `fname` and the key to validate it.
+        Only enabled when KIBOT_CONFIG_CACHE is defined. The name depends only on the config path, so each
+        config has one entry. The key includes the file time stamp and size, the KiBot version and the
+        preprocessor definitions. """
+    if not os.environ.get('KIBOT_CONFIG_CACHE') or not isinstance(fname, str):
+        return None, None
+    try:
+        st = os.stat(fname)
+    except OSError:
+        return None, None
+    key = [st.st_mtime_ns, st.st_size, __version__, sorted(GS.cli_defines.items())]
+    name = os.path.join(os.path.expanduser('~'), '.cache', 'kibot', 'config',
+                        hashlib.blake2b(os.path.abspath(fname).encode()).hexdigest()+'.pkl')
+    return name, key
+
+
+def load_config_cache(cache_name, key):
+    try:
+        with open(cache_name, 'rb') as f:
+            cached = pickle.load(f)
+    except Exception:
+        return None
+    if not isinstance(cached, dict) or cached.get('key') != key:
+        return None
+    logger.debug('Using cached config from `{}`'.format(cache_name))
+    return cached.get('data')
+
+
+def save_config_cache(cache_name, key, data):
+    tmp_name = '{}.{}.tmp'.format(cache_name, os.getpid())
+    try:
+        os.makedirs(os.path.dirname(cache_name), exist_ok=True)
+        with open(tmp_name, 'wb') as f:
+            pickle.dump({'key': key, 'data': data}, f)
+        os.replace(tmp_name, cache_name)
+    except OSError as e:
+        logger.debug('Failed to cache the config: {}'.format(e))
+
+
 def update_dict(d, u):
     for k, v in u.items():
         if isinstance(v, collections.abc.Mapping):
@@ -569,6 +610,11 @@ class CfgYamlReader(object):
         return all_collected
 
     def load_yaml(self, fstream):
+        cache_name, cache_key = get_config_cache(getattr(fstream, 'name', None))
+        if cache_name is not None:
+            data = load_config_cache(cache_name, cache_key)
+            if data is not None:
+                return data
         if GS.cli_defines:
             # Load the file to memory so we can preprocess it
             content = fstream.read()
@@ -588,6 +634,8 @@ class CfgYamlReader(object):
         if 'globals' in data and 'global' not in data:
             data['global'] = data['globals']
             del data['globals']
+        if cache_name is not None:
+            save_config_cache(cache_name, cache_key, data)
         return data
 
     def _check_invalid_in_kibot(self, main_sec):
@@ -764,7 +812,7 @@ def print_outputs_help(details=False):
         print('1. Most relevant options are listed first and in **bold**. '
               'Which ones are more relevant is quite arbitrary, comments are welcome.')
         print('2. Aliases are listed in *italics*.')
-    for n, o in OrderedDict(sorted(outs.items())).items():
+    for n, o in sorted(outs.items()):
         if details:
             print()
         print_one_out_help(details, n, o)
@@ -781,7 +829,7 @@ def print_preflights_help():
     prefs = BasePreFlight.get_registered()
     logger.debug('{} supported preflights'.format(len(prefs)))
     print('Supported preflight options:\n')
-    for n, o in OrderedDict(sorted(prefs.items())).items():
+    for n, o in sorted(prefs.items()):
         help, options = o.get_doc()
         if help is None:
             help = 'Undocumented'
@@ -795,7 +843,7 @@ def print_variants_help():
     vars = BaseVariant.get_registered()
     logger.debug('{} supported variants'.format(len(vars)))
     print('Supported variants:\n')
-    for n, o in OrderedDict(sorted(vars.items())).items():
+    for n, o in sorted(vars.items()):
         help = o.__doc__
         if help is None:
             help = 'Undocumented'
@@ -807,7 +855,7 @@ def print_filters_help():
     filters = RegFilter.get_registered()
     logger.debug('{} supported filters'.format(len(filters)))
     print('Supported filters:\n')
-    for n, o in OrderedDict(sorted(filters.items())).items():
+    for n, o in sorted(filters.items()):
         help = o.__doc__
         if help is None:
             help = 'Undocumented'
@@ -904,7 +952,7 @@ def create_example(pcb_file, out_dir, copy_options, copy_expand):
         # Preflights
         f.write('\npreflight:\n')
         prefs = BasePreFlight.get_registered()
-        for n, o in OrderedDict(sorted(prefs.items())).items():
+        for n, o in sorted(prefs.items()):
             if o.__doc__:
                 lines = trim(o.__doc__.rstrip()+'.')
                 for ln in lines:
@@ -926,7 +974,7 @@ def create_example(pcb_file, out_dir, copy_options, copy_expand):
                 # Layers and plot options from the PCB
                 layers = 'selected'
                 po = board.GetPlotOptions()
-        for n, cls in OrderedDict(sorted(outs.items())).items():
+        for n, cls in sorted(outs.items()):
             lines = trim(cls.__doc__)
             if len(lines) == 0:
                 lines = ['Undocumented', 'No description']
@@ -1005,8 +1053,7 @@ def print_dependencies(markdown=True, jsn=False):
         print(json.dumps(RegDependency.get_registered(), cls=MyEncoder, indent=4, sort_keys=True))
         return
     # Now print them sorted by importance (and by name as a second criteria)
-    for name, dep in sorted(sorted(RegDependency.get_registered().items(), key=lambda x: x[0].lower()),   # noqa C414
-                            key=lambda x: x[1].importance, reverse=True):
+    for name, dep in sorted(RegDependency.get_registered().items(), key=lambda x: (-x[1].importance, x[0].lower())):
         deb = ''
         if markdown:
             dtype = PY_LOGO if dep.is_python else TOOL_LOGO
@@ -19,6 +19,7 @@ from subprocess import run, PIPE, STDOUT, Popen, CalledProcessError
 from glob import glob
 from importlib.util import spec_from_file_location, module_from_spec
 from collections import OrderedDict
+from operator import attrgetter
 
 from .gs import GS
 from .registrable import RegOutput
@@ -482,17 +483,18 @@ def _generate_outputs(outputs, targets, invert, skip_pre, cli_order, no_priority
         else:
             # Add them in the declared order
             new_targets = []
+            selected = set(targets)
             if invert:
                 # Invert the selection
                 for out in RegOutput.get_outputs():
-                    if (out.name not in targets) and out.run_by_default:
+                    if (out.name not in selected) and out.run_by_default:
                         new_targets.append(out)
                     else:
                         logger.debug('Skipping `{}` output'.format(out.name))
             else:
                 # Normal list
                 for out in RegOutput.get_outputs():
-                    if out.name in targets:
+                    if out.name in selected:
                         new_targets.append(out)
                     else:
                         logger.debug('Skipping `{}` output'.format(out.name))
@@ -503,7 +505,7 @@ def _generate_outputs(outputs, targets, invert, skip_pre, cli_order, no_priority
     logger.debug('Outputs after preflights: {}'.format([t.name for t in targets]))
     if not cli_order and not no_priority:
         # Sort by priority
-        targets = sorted(targets, key=lambda o: o.priority, reverse=True)
+        targets = sorted(targets, key=attrgetter('priority'), reverse=True)
         logger.debug('Outputs after sorting: {}'.format([t.name for t in targets]))
     # Configure and run the outputs
     for out in targets:
@@ -912,7 +914,7 @@ def generate_one_example(dest_dir, types):
         needed_imports = set()
         # All the outputs
         outputs = []
-        for n, cls in OrderedDict(sorted(outs.items())).items():
+        for n, cls in sorted(outs.items()):
             o = cls()
             if types and n not in types:
                 logger.debug('- {}, not selected (PCB: {} SCH: {})'.format(n, o.is_pcb(), o.is_sch()))
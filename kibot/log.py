@@ -248,7 +248,8 @@ class CustomFormatter(logging.Formatter):
 
 
 def set_file_log(fname):
-    fh = logging.FileHandler(fname)
+    """ Log to the specified file, any previous content is discarded """
+    fh = logging.FileHandler(fname, mode='w')
     fh.setLevel(logging.DEBUG)
     fh.setFormatter(CustomFormatter())
     root_logger.addHandler(fh)
@@ -4,7 +4,7 @@
 # License: GPL-3.0
 # Project: KiBot (formerly KiPlot)
 from decimal import Decimal
-from fnmatch import fnmatch
+from fnmatch import translate
 import os
 import re
 import requests
@@ -450,11 +450,17 @@ class Base3DOptions(VariantOptions):
         # For the mode where we copy the 3D models
         self.source_models = set()
         is_copy_mode = rename_filter is not None
+        if is_copy_mode:
+            # Same as fnmatch, but compiled once
+            rename_match = re.compile(translate(os.path.normcase(rename_filter))).match
         rel_dirs = getattr(rename_data, 'rel_dirs', [])
         extra_debug = GS.debug_level > 3
         if all_comps is None:
             all_comps = []
         all_comps_hash = {c.ref: c for c in all_comps}
+        # Most boards use the same 3D model for a lot of footprints, solve each name once
+        # (file name, lib nickname) -> (full name, used extra, found)
+        solved_names = {}
         # Find the LCSC field
         lcsc_field = self.solve_field_name('_field_lcsc_part', empty_when_none=True)
         # Find a place to store the downloaded models
@@ -468,12 +474,14 @@ class Base3DOptions(VariantOptions):
             logger.debug('Using `{}` as dir for downloaded 3D models'.format(self._tmp_dir))
         # Look for all the footprints
         for m in GS.get_modules():
-            ref = m.GetReference()
-            lib_id = m.GetFPID()
-            lib_nickname = str(lib_id.GetLibNickname())
-            sch_comp = all_comps_hash.get(ref, None)
             # Extract the models (the iterator returns copies)
             models = m.Models()
+            if models.empty():
+                # Skip the rest of the calls to KiCad, i.e. fiducials, logos, etc.
+                continue
+            ref = m.GetReference()
+            lib_nickname = str(m.GetFPID().GetLibNickname())
+            sch_comp = all_comps_hash.get(ref, None)
             models_l = []
             while not models.empty():
                 models_l.append(models.pop())
@@ -484,12 +492,18 @@ class Base3DOptions(VariantOptions):
                     if extra_debug:
                         logger.debug("- Skipping {} (disabled)".format(m3d.m_Filename))
                     continue
-                if is_copy_mode and not fnmatch(m3d.m_Filename, rename_filter):
+                if is_copy_mode and not rename_match(os.path.normcase(m3d.m_Filename)):
                     # Skip filtered footprints
                     continue
-                used_extra = [False]
-                full_name = do_expand_env(m3d.m_Filename, used_extra, extra_debug, lib_nickname)
-                if not os.path.isfile(full_name):
+                key = (m3d.m_Filename, lib_nickname)
+                solved = solved_names.get(key)
+                if solved is None:
+                    used_extra = [False]
+                    full_name = do_expand_env(m3d.m_Filename, used_extra, extra_debug, lib_nickname)
+                    solved = solved_names[key] = (full_name, used_extra[0], os.path.isfile(full_name))
+                full_name = solved[0]
+                used_extra = [solved[1]]
+                if not solved[2]:
                     logger.debugl(2, 'Missing 3D model file {} ({})'.format(full_name, m3d.m_Filename))
                     # Missing 3D model
                     if self.download:
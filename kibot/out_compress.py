@@ -23,6 +23,7 @@ from subprocess import check_output, STDOUT, CalledProcessError
 from zipfile import ZipFile, ZIP_STORED, ZIP_DEFLATED, ZIP_BZIP2, ZIP_LZMA
 from tarfile import open as tar_open
 from collections import OrderedDict
+from itertools import chain
 from .gs import GS
 from .kiplot import config_output, run_output, get_output_targets
 from .misc import WRONG_INSTALL, W_EMPTYZIP, INTERNAL_ERROR
@@ -56,6 +57,11 @@ class FilesList(Optionable):
             self.dest = ''
             """ Destination directory inside the archive, empty means the same of the file """
 
+    def config(self, parent):
+        super().config(parent)
+        # The default matches anything, no need to use the regex engine for each file
+        self._filter_re = None if self.filter == '.*' else re.compile(self.filter)
+
 
 class CompressOptions(BaseOptions):
     ZIP_ALGORITHMS = {'auto': ZIP_DEFLATED,
@@ -176,13 +182,14 @@ class CompressOptions(BaseOptions):
                             # - We must parse the input markdown
                             # - We must coinfigure and use the renderer output to do the file name expansion
                             # This is almost as complex as generating the whole output, so it adds the dir
-                            extra_files = glob.iglob(os.path.join(file, '**'))
+                            extra_files.append(glob.iglob(os.path.join(file, '**')))
                     if extra_files:
-                        files_list += extra_files
+                        files_list = chain(files_list, *extra_files)
             else:
                 out_dir = out_dir_cwd if f.from_cwd else out_dir_default
                 source = f.expand_filename_both(f.source, make_safe=False)
-                files_list = glob.iglob(os.path.join(out_dir, source), recursive=True)
+                pattern = os.path.join(out_dir, source)
+                files_list = glob.iglob(pattern, recursive='**' in pattern)
                 if GS.debug_level > 1:
                     files_list = list(files_list)
                     logger.debug('- Pattern {} list of files: {}'.format(source, files_list))
@@ -191,7 +198,9 @@ class CompressOptions(BaseOptions):
             if f.from_output_dir:
                 out_dir = output_out_dir
             # Filter and adapt them
-            for fname in filter(re.compile(f.filter).match, files_list):
+            if f._filter_re is not None:
+                files_list = filter(f._filter_re.match, files_list)
+            for fname in files_list:
                 fname_real = os.path.realpath(fname) if self.follow_links else os.path.abspath(fname)
                 # Avoid including the output
                 if fname_real == output_real:
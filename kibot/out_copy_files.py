@@ -3,11 +3,12 @@
 # Copyright (c) 2022-2023 Instituto Nacional de Tecnología Industrial
 # License: GPL-3.0
 # Project: KiBot (formerly KiPlot)
+from concurrent.futures import ThreadPoolExecutor
 import fnmatch
 import glob
 import os
 import re
-from shutil import copy2
+from shutil import copy2, copystat
 from sys import exit
 from .error import KiPlotConfigurationError
 from .gs import GS
@@ -21,6 +22,42 @@ from .macros import macros, document, output_class  # noqa: F401
 from . import log
 
 logger = log.get_logger()
+COPY_CHUNK = 1 << 30
+
+
+def copy_file(src, dest):
+    """ Same as shutil.copy2, but tries to do an in-kernel copy using copy_file_range.
+        This avoids moving the data to user space and can use reflinks on some file systems. """
+    if hasattr(os, 'copy_file_range'):
+        try:
+            with open(src, 'rb') as f_src, open(dest, 'wb') as f_dst:
+                fd_src = f_src.fileno()
+                fd_dst = f_dst.fileno()
+                size = os.fstat(fd_src).st_size
+                copied = 0
+                while True:
+                    n = os.copy_file_range(fd_src, fd_dst, COPY_CHUNK)
+                    if not n:
+                        break
+                    copied += n
+        except OSError:
+            # Not supported by the kernel or file system (i.e. EXDEV on old kernels)
+            copy2(src, dest)
+            return
+        if not copied or copied < size:
+            # Some kernel/file system combinations return 0 without copying anything (i.e. procfs, sysfs, FUSE).
+            # procfs also reports 0 as size, so when nothing was copied let copy2 check it (as shutil does)
+            copy2(src, dest)
+            return
+        copystat(src, dest)
+    else:
+        copy2(src, dest)
+
+
+def rel_dirs_prefixes(rel_dirs):
+    """ (dir, dir+separator) tuples used to find the dir containing a 3D model.
+        The most specific (longest) dirs are first. The separator avoids matching a dir that starts with the same name. """
+    return [(d, d.rstrip(os.sep)+os.sep) for d in sorted(filter(None, rel_dirs), key=len, reverse=True)]
 
 
 def may_be_rel(file):
@@ -56,6 +93,11 @@ class FilesList(Optionable):
             """ Only usable for the `3d_models` mode.
                 Save a PCB copy modified to use the copied 3D models """
 
+    def config(self, parent):
+        super().config(parent)
+        # The default matches anything, no need to use the regex engine for each file
+        self._filter_re = None if self.filter == '.*' else re.compile(self.filter)
+
     def apply_rename(self, fname):
         is_abs = os.path.isabs(fname)
         append_mode = self.dest and self.dest[-1] == '+'
@@ -63,8 +105,11 @@ class FilesList(Optionable):
             # A destination specified by the user
             dest = os.path.basename(fname)
         elif is_abs:
-            for d in self.rel_dirs:
-                if d is not None and fname.startswith(d):
+            if self._rel_dirs_sep is None:
+                # Solved here because download_models adds the dir for the downloaded models
+                self._rel_dirs_sep = rel_dirs_prefixes(self.rel_dirs)
+            for d, prefix in self._rel_dirs_sep:
+                if fname.startswith(prefix):
                     dest = os.path.relpath(fname, d)
                     break
             else:
@@ -91,6 +136,8 @@ class Copy_FilesOptions(Base3DOptions):
         super().config(parent)
         if isinstance(self.files, type):
             raise KiPlotConfigurationError('No files provided')
+        # (output_dir, no_out_run) -> get_files result
+        self._files_cache = {}
 
     def get_from_output(self, f, no_out_run):
         from_output = f.source
@@ -125,10 +172,11 @@ class Copy_FilesOptions(Base3DOptions):
         if dest_dir and dest_dir[-1] == '+':
             dest_dir = dest_dir[:-1]
         f.output_dir = dest_dir
-        # Apply any variant
-        self.filter_pcb_components(do_3D=True, do_2D=True)
+        # Apply any variant, returns False when there is nothing to filter
+        filtered = self.filter_pcb_components(do_3D=True, do_2D=True)
         # Download missing models and rename all collect 3D models (renamed)
         f.rel_dirs = self.rel_dirs
+        f._rel_dirs_sep = None
         files_list = self.download_models(rename_filter=f.source, rename_function=FilesList.apply_rename, rename_data=f)
         if f.save_pcb:
             fname = os.path.join(self.output_dir, os.path.basename(GS.pcb_file))
@@ -138,23 +186,27 @@ class Copy_FilesOptions(Base3DOptions):
         if not self._comps:
             # We must undo the download/rename
             self.undo_3d_models_rename(GS.board)
-        else:
+        if filtered:
+            # Note: when we only have a sub-PCB this just reverts it
             self.unfilter_pcb_components(do_3D=True, do_2D=True)
         # Also include the step/wrl counterpart
-        new_list = []
-        for fn in files_list:
-            if fn.endswith('.wrl'):
-                fn = fn[:-4]+'.step'
-                if os.path.isfile(fn):
-                    new_list.append(fn)
-            elif fn.endswith('.step'):
-                fn = f[:-5]+'.wrl'
-                if os.path.isfile(fn):
-                    new_list.append(fn)
-        return files_list+fnmatch.filter(new_list, f.source)
+        files_set = set(files_list)
+        candidates = (fn[:-4]+'.step' if fn.endswith('.wrl') else fn[:-5]+'.wrl'
+                      for fn in files_list if fn.endswith(('.wrl', '.step')))
+        new_list = [fn for fn in candidates if fn not in files_set and os.path.isfile(fn)]
+        match = re.compile(fnmatch.translate(os.path.normcase(f.source))).match
+        return files_list+[fn for fn in new_list if match(os.path.normcase(fn))]
 
     def get_files(self, no_out_run=False):
-        files = []
+        """ Memoized version of _get_files, used to avoid downloading/renaming the 3D models again """
+        key = (getattr(self, 'output_dir', None), no_out_run)
+        files = self._files_cache.get(key)
+        if files is None:
+            files = self._files_cache[key] = list(self._get_files(no_out_run))
+        return files
+
+    def _get_files(self, no_out_run):
+        """ Generator for the (source, destination) tuples """
         src_dir_cwd = os.getcwd()
         src_dir_outdir = self.expand_filename_sch(GS.out_dir)
         self.rel_dirs = []
@@ -163,6 +215,12 @@ class Copy_FilesOptions(Base3DOptions):
         if KiConf.party_3rd_dir:
             self.rel_dirs.append(os.path.normpath(os.path.join(GS.pcb_dir, KiConf.party_3rd_dir)))
         self.rel_dirs.append(GS.pcb_dir)
+        # Local names for the functions used in the inner loop
+        join = os.path.join
+        basename = os.path.basename
+        relpath = os.path.relpath
+        isabs = os.path.isabs
+        get_real = os.path.realpath if self.follow_links else os.path.abspath
         for f in self.files:
             from_outdir = False
             if f.source_type == 'out_files' or f.source_type == 'output':
@@ -176,34 +234,41 @@ class Copy_FilesOptions(Base3DOptions):
                 files_list = self.get_from_output(f, no_out_run)
             elif mode_3d:
                 files_list = self.get_3d_models(f)
+                # The list can grow while getting the models (downloaded models dir)
+                rel_dirs_sep = rel_dirs_prefixes(self.rel_dirs)
             else:  # files and out_files
                 source = f.expand_filename_both(f.source, make_safe=False)
-                files_list = glob.iglob(os.path.join(src_dir, source), recursive=True)
+                pattern = os.path.join(src_dir, source)
+                if glob.has_magic(pattern):
+                    # Note: glob already solves the literal part of the path without listing it
+                    files_list = glob.iglob(pattern, recursive='**' in pattern)
+                else:
+                    # No wildcards, glob would just check if the file exists
+                    files_list = [pattern] if os.path.lexists(pattern) else []
                 if GS.debug_level > 1:
                     files_list = list(files_list)
                     logger.debug('- Pattern {} list of files: {}'.format(source, files_list))
             # Filter and adapt them
-            for fname in filter(re.compile(f.filter).match, files_list):
-                fname_real = os.path.realpath(fname) if self.follow_links else os.path.abspath(fname)
+            if f._filter_re is not None:
+                files_list = filter(f._filter_re.match, files_list)
+            for fname in files_list:
+                fname_real = get_real(fname)
                 # Compute the destination directory
-                dest = fname
-                is_abs = os.path.isabs(fname)
                 if f.dest and not mode_3d_append:
                     # A destination specified by the user
-                    dest = os.path.join(f.dest, os.path.basename(fname))
-                elif mode_3d and is_abs:
-                    for d in self.rel_dirs:
-                        if d is not None and fname.startswith(d):
-                            dest = os.path.relpath(dest, d)
+                    dest = join(f.dest, basename(fname))
+                elif mode_3d and isabs(fname):
+                    for d, prefix in rel_dirs_sep:
+                        if fname.startswith(prefix):
+                            dest = relpath(fname, d)
                             break
                     else:
-                        dest = os.path.basename(fname)
+                        dest = basename(fname)
                     if mode_3d_append:
-                        dest = os.path.join(f.dest[:-1], dest)
+                        dest = join(f.dest[:-1], dest)
                 else:
-                    dest = os.path.relpath(dest, src_dir)
-                files.append((fname_real, dest))
-        return files
+                    dest = relpath(fname, src_dir)
+                yield (fname_real, dest)
 
     def get_targets(self, out_dir):
         self.output_dir = out_dir
@@ -218,32 +283,53 @@ class Copy_FilesOptions(Base3DOptions):
         super().run(output)
         # Output file name
         logger.debug('Collecting files')
-        # Collect the files
-        files = self.get_files()
-        logger.debug('Copying files')
+        # Collect the files, no need for a list, the destinations are deduplicated on the fly
+        files = self._get_files(no_out_run=False)
         output += os.path.sep
+        # Destination -> source, only the last source for each destination is copied
         copied = {}
         for (src, dst) in files:
             dest = os.path.join(output, dst)
+            prev = copied.get(dest)
+            if prev is not None:
+                logger.warning(W_COPYOVER+'`{}` and `{}` both are copied to `{}`'.
+                               format(may_be_rel(src), may_be_rel(prev), may_be_rel(dest)))
+            copied[dest] = src
+        logger.debug('Copying files')
+        # Directories we already know they exist
+        dest_dirs = set()
+        # Destination -> source, the copies are done in parallel once the destinations are ready
+        to_copy = {}
+        for dest, src in copied.items():
             dest_dir = os.path.dirname(dest)
-            if not os.path.isdir(dest_dir):
-                os.makedirs(dest_dir)
+            if dest_dir not in dest_dirs:
+                os.makedirs(dest_dir, exist_ok=True)
+                dest_dirs.add(dest_dir)
             logger.debug('- {} -> {}'.format(src, dest))
-            if dest in copied:
-                logger.warning(W_COPYOVER+'`{}` and `{}` both are copied to `{}`'.
-                               format(may_be_rel(src), may_be_rel(copied[dest]), may_be_rel(dest)))
+            # Same as samefile, but the destination usually doesn't exist, so we check it first and save a stat
             try:
-                if os.path.samefile(src, dest):
+                if os.path.samestat(os.stat(dest), os.stat(src)):
                     raise KiPlotConfigurationError('Trying to copy {} over itself {}'.format(src, dest))
             except FileNotFoundError:
                 pass
-            if os.path.isfile(dest) or os.path.islink(dest):
+            # Remove any previous file or symlink, a single syscall in the common case
+            try:
                 os.remove(dest)
+            except FileNotFoundError:
+                pass
+            except OSError:
+                if not os.path.isdir(dest):
+                    raise
             if self.link_no_copy:
-                os.symlink(os.path.relpath(src, os.path.dirname(dest)), dest)
+                os.symlink(os.path.relpath(src, dest_dir), dest)
             else:
-                copy2(src, dest)
-            copied[dest] = src
+                to_copy[dest] = src
+        if to_copy:
+            # The copy is I/O bound and releases the GIL, keep various operations in flight
+            with ThreadPoolExecutor(max_workers=min(32, (os.cpu_count() or 1)*4)) as executor:
+                # Consume the results to get any exception
+                for _ in executor.map(copy_file, to_copy.values(), to_copy.keys()):
+                    pass
         # Remove the downloaded 3D models
         self.remove_temporals()
 
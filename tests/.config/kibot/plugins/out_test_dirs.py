@@ -0,0 +1,38 @@
+import os
+from .optionable import BaseOptions
+from kibot.macros import macros, document, output_class  # noqa: F401
+from . import log
+
+logger = log.get_logger(__name__)
+DIRS = ('dir_a', 'dir_b')
+
+
+class Test_DirsOptions(BaseOptions):
+    def __init__(self):
+        super().__init__()
+        with document:
+            self.foo = True
+            """ Not used """  # pragma: no cover
+
+    def get_targets(self, out_dir):
+        return [os.path.join(out_dir, d) for d in DIRS]
+
+
+@output_class
+class Test_Dirs(BaseOutput):  # noqa: F821
+    """ Test for plugin
+        An output that generates two directories.
+        Nothing useful, just a test. """
+    def __init__(self):
+        super().__init__()
+        with document:
+            self.options = Test_DirsOptions
+            """ [dict] Options for the `test_dirs` output """  # pragma: no cover
+
+    def run(self, output_dir):
+        logger.debug("Running test_dirs plug-in with "+output_dir)
+        for d in DIRS:
+            dir_name = os.path.join(output_dir, d)
+            os.makedirs(dir_name, exist_ok=True)
+            with open(os.path.join(dir_name, d+'.txt'), 'wt') as f:
+                f.write(d+'\n')
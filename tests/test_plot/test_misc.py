@@ -790,6 +790,18 @@ def test_compress_fail_deps(test_dir, monkeypatch):
     ctx.clean_up()
 
 
+def test_compress_dirs(test_dir, monkeypatch):
+    """ An output that returns two dirs, both must be included """
+    prj = '3Rs'
+    ctx = context.TestContext(test_dir, prj, 'compress_dirs', 'Test')
+    ctx.home_local_link()
+    with monkeypatch.context() as m:
+        m.setenv("HOME", os.path.join(ctx.get_board_dir(), '../..'))
+        ctx.run()
+    ctx.test_compress(prj+'-result.zip', ['Test/dir_a/dir_a.txt', 'Test/dir_b/dir_b.txt'])
+    ctx.clean_up()
+
+
 def test_import_1(test_dir):
     """ Import some outputs """
     prj = 'test_v5'
@@ -1553,6 +1565,24 @@ def test_copy_files_2(test_dir):
     ctx.clean_up()
 
 
+@pytest.mark.slow
+@pytest.mark.skipif(context.ki5(), reason="KiCad 6 aliases used")
+def test_copy_files_3(test_dir):
+    """ Copy 3D models, one is a STEP and we must also copy the WRL counterpart """
+    prj = 'copy_files_step'
+    ctx = context.TestContext(test_dir, prj, 'copy_files_3', 'test.files')
+    os.environ['KIBOT_3D_MODELS'] = '/tmp'
+    ctx.run(kicost=True)  # We use the fake web server
+    del os.environ['KIBOT_3D_MODELS']
+    # The STEP used by the PCB and its WRL counterpart
+    ctx.expect_out_file('3d_models/Resistor_SMD.3dshapes/R_0805_2012Metrico.step', sub=True)
+    ctx.expect_out_file('3d_models/Resistor_SMD.3dshapes/R_0805_2012Metrico.wrl', sub=True)
+    # The PCB points to the STEP
+    ctx.search_in_file(prj+'.kicad_pcb', [r'model "\$\{KIPRJMOD\}/3d_models/Resistor_SMD.3dshapes/R_0805_2012Metrico.step"'],
+                       sub=True)
+    ctx.clean_up()
+
+
 def test_sub_pcb_bp(test_dir):
     """ Test a multiboard example """
     prj = 'batteryPack'
@@ -1645,3 +1675,38 @@ def test_netclass_flag_1(test_dir):
     ctx.run()
     ctx.expect_out_file_d(prj+'-bom.csv')
     ctx.clean_up()
+
+
+def test_config_cache(test_dir, monkeypatch):
+    """ Cache for the parsed YAML (KIBOT_CONFIG_CACHE) """
+    prj = '3Rs'
+    ctx = context.TestContext(test_dir, prj, 'simple_position_unified_th_csv', POS_DIR)
+    # Use a copy of the config, we change its time stamp
+    cfg = ctx.get_out_path('cache.kibot.yaml')
+    shutil.copy2(ctx.yaml_file, cfg)
+    ctx.yaml_file = cfg
+    home = ctx.get_out_path('home')
+    cache_dir = os.path.join(home, '.cache', 'kibot', 'config')
+    with monkeypatch.context() as m:
+        m.setenv('HOME', home)
+        m.setenv('KIBOT_CONFIG_CACHE', '1')
+        # The first run creates the cache
+        ctx.run()
+        ctx.search_err('Using cached config', invert=True)
+        assert len(os.listdir(cache_dir)) == 1
+        # The second run uses it
+        ctx.run()
+        ctx.search_err('Using cached config')
+        # A different definition must parse it again
+        ctx.run(extra=['-E', 'A=1'])
+        ctx.search_err('Using cached config', invert=True)
+        # A modified config must be parsed again
+        st = os.stat(cfg)
+        os.utime(cfg, ns=(st.st_atime_ns, st.st_mtime_ns+1000000000))
+        ctx.run()
+        ctx.search_err('Using cached config', invert=True)
+        ctx.run()
+        ctx.search_err('Using cached config')
+        # Only one entry for each config
+        assert len(os.listdir(cache_dir)) == 1
+    ctx.clean_up()
@@ -1,4 +1,5 @@
 from decimal import Decimal as D
+import json
 import os
 import re
 import pytest
@@ -19,7 +20,9 @@ from kibot.bom.columnlist import ColumnList
 from kibot.bom.units import get_prefix, comp_match
 import kibot.bom.units as units
 from kibot.bom.electro_grammar import parse
-from kibot.__main__ import detect_kicad
+from kibot.__main__ import detect_kicad, __doc__ as main_doc
+from kibot.cli_parser import parse_args
+from kibot.docopt import docopt
 from kibot.kicad.config import KiConf
 from kibot.globals import Globals
 from kibot.PcbDraw.unit import read_resistance
@@ -337,6 +340,47 @@ def test_search_as_plugin_fail(test_dir, caplog):
         assert fname is None
 
 
+def test_kicad_env_cache(test_dir, caplog, monkeypatch):
+    """ Cache for the detected KiCad environment (KIBOT_KICAD_CACHE) """
+    ctx = context.TestContext(test_dir, 'test_v5', 'empty_zip', '')
+    home = ctx.get_out_path('home')
+    cache = os.path.join(home, '.cache', 'kibot', 'kicad_env.json')
+    with context.cover_it(cov):
+        with monkeypatch.context() as m:
+            m.setenv('HOME', home)
+            m.setenv('KIBOT_KICAD_CACHE', '1')
+            m.delenv('KICAD_CONFIG_HOME', raising=False)
+            # First run: create the cache
+            detect_kicad()
+            assert os.path.isfile(cache)
+            with open(cache, 'rt') as f:
+                data = json.load(f)
+            assert data['kicad_version'] == GS.kicad_version
+            assert data['kicad_conf_path'] == GS.kicad_conf_path
+            # Second run: use it, we change the path to know it was used
+            data['kicad_conf_path'] = '/cached/path'
+            with open(cache, 'wt') as f:
+                json.dump(data, f)
+            detect_kicad()
+            assert GS.kicad_conf_path == '/cached/path'
+            # A different key invalidates it
+            m.setenv('KICAD_CONFIG_HOME', ctx.get_out_path('kicad_conf'))
+            detect_kicad()
+            assert GS.kicad_conf_path != '/cached/path'
+            # A guessed version isn't cached
+            os.remove(cache)
+            import pcbnew
+            m.delattr(pcbnew, 'GetBuildVersion')
+            m.setattr(pcbnew, 'GetKicadConfigPath', lambda: ctx.get_out_path('kicad_conf'), raising=False)
+            detect_kicad()
+            assert GS.kicad_version == '5.1.5'
+            assert 'Unknown KiCad version' in caplog.text
+            assert not os.path.isfile(cache)
+    # Restore the real environment
+    detect_kicad()
+    ctx.clean_up()
+
+
 @pytest.mark.indep
 def test_layer_no_id():
     with context.cover_it(cov):
@@ -548,3 +592,34 @@ def test_electro_grammar_1():
                 res = parse(c)
                 assert res == ref, "For `{}` got:\n{}\nExpected:\n{}".format(c, res, ref)
                 logging.debug(c+" Ok")
+
+
+@pytest.mark.indep
+def test_cli_parser():
+    with context.cover_it(cov):
+        # Valid command lines must be parsed as docopt does
+        TESTS = ([], ['-v'], ['-vvv'], ['-q'], ['-c', 'x.yaml', '--list'], ['-vl'], ['-dout', 't1', 't2'],
+                 ['--out-dir=o', 't1', '-v'], ['-E', 'A=1', '-g', 'x=y', 't'], ['-s', 'all', '-i'], ['-x', '-p'],
+                 ['-x', '-d', 'o', '-b', 'b.kicad_pcb'], ['--quick-start', '-t', 'a', '--type', 'b', '--dry'],
+                 ['--help-dependencies', '--markdown'], ['--help-output=gerber'], ['--help-banners'],
+                 ['--banner', '3', '--list'], ['-L', 'log.txt', '-vv'], ['-m', 'Makefile'], ['-w', '1,2'], ['-A', '-D'])
+        for argv in TESTS:
+            res = parse_args(argv)
+            assert res is not None, argv
+            ref = docopt(main_doc, argv=argv, options_first=True)
+            assert res == ref, argv
+            assert vars(res) == vars(ref), argv
+        # docopt repeats the last value of a list option used more than once (-E a -E a -> [a, a, a])
+        # The values end in a dict, so we just compare without duplicates
+        for argv in (['-Ecx', '-Ecx'], ['-E', 'A=1', '-E', 'B=2', '-g', 'x=y', '-g', 'z=w'], ['--define=A=1', '-EA=1', 't']):
+            res = parse_args(argv)
+            assert res is not None, argv
+            ref = docopt(main_doc, argv=argv, options_first=True)
+            for k in ('--define', '--global-redef'):
+                assert list(dict.fromkeys(res[k])) == list(dict.fromkeys(ref[k])), argv
+                res[k] = ref[k]
+            assert res == ref, argv
+        # Errors, help and abbreviations are solved by docopt
+        for argv in (['-q', '-v'], ['-d', 'o', '--list'], ['--list', 't1'], ['-c', 'a', '-c', 'b'], ['--verb'], ['-z'],
+                     ['-d'], ['--help'], ['--version'], ['--help-outputs', '--help-filters']):
+            assert parse_args(argv) is None, argv
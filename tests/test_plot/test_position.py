@@ -168,6 +168,19 @@ def test_position_3Rs_pre_csv(test_dir):
     ctx.clean_up()
 
 
+def test_position_3Rs_pre_csv_gz(test_dir):
+    """ Test using preprocessor on a compressed configuration YAML file """
+    ctx = context.TestContext(test_dir, '3Rs', 'simple_position_csv_pre', POS_DIR+'_millimeters', yaml_compressed=True)
+    ctx.run(extra=['-E', 'UNITS=millimeters'])
+    pos_top = ctx.get_pos_top_csv_filename()
+    pos_bot = ctx.get_pos_bot_csv_filename()
+    ctx.expect_out_file(pos_top)
+    ctx.expect_out_file(pos_bot)
+    expect_position(ctx, pos_top, ['R1'], ['R2', 'R3'], csv=True)
+    expect_position(ctx, pos_bot, ['R2'], ['R1', 'R3'], csv=True)
+    ctx.clean_up()
+
+
 def test_position_3Rs_unified_csv(test_dir):
     """ Also test the quiet mode """
     ctx = context.TestContext(test_dir, '3Rs', 'simple_position_unified_csv', POS_DIR)